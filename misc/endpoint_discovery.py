@@ -1,7 +1,7 @@
 # Run: mitmproxy -s misc/endpoint_discovery.py -p 8080 -q
 
 from mitmproxy import ctx
-import json, os
+import orjson, os, queue, threading
 
 target_site = "kick.com"
 api_docs_dir = "api_docs"
@@ -9,6 +9,33 @@ api_docs_dir = "api_docs"
 if not os.path.exists(api_docs_dir):
     os.makedirs(api_docs_dir)
 
+# (path, bytes) pairs written by a background thread to keep file I/O off mitmproxy's flow thread
+write_queue = queue.SimpleQueue()
+STOP = None
+
+
+def writer():
+    while True:
+        item = write_queue.get()
+        if item is STOP:
+            return
+        path, data = item
+        try:
+            with open(path, "wb", buffering=1 << 20) as f:
+                f.write(data)
+        except OSError as e:
+            ctx.log.warn(f"Failed to write {path}: {e}")
+
+
+writer_thread = threading.Thread(target=writer, name="api-docs-writer", daemon=True)
+writer_thread.start()
+
+
+def done():
+    # Drain pending writes before mitmproxy exits so no captured endpoint is lost
+    write_queue.put(STOP)
+    writer_thread.join()
+
 
 def request(flow):
     if target_site in flow.request.pretty_url and "api" in flow.request.pretty_url:
@@ -18,11 +45,11 @@ def request(flow):
 
         if flow.request.method in ["POST", "PUT", "PATCH"]:
             try:
-                if flow.request.text:
-                    json_data = json.loads(flow.request.text)
+                if flow.request.content:
+                    json_data = orjson.loads(flow.request.content)
                     print("\nRequest Body:")
-                    print(json.dumps(json_data, indent=2))
-            except json.JSONDecodeError:
+                    print(orjson.dumps(json_data, option=orjson.OPT_INDENT_2).decode())
+            except (orjson.JSONDecodeError, ValueError):
                 print(f"\nRequest Body: {flow.request.text}")
 
 
@@ -31,19 +58,17 @@ def response(flow):
         if flow.response and flow.response.status_code:
             print(f"\nResponse Status: {flow.response.status_code}")
             try:
-                if flow.response.text:
-                    json_data = json.loads(flow.response.text)
+                if flow.response.content:
+                    json_data = orjson.loads(flow.response.content)
+                    pretty = orjson.dumps(json_data, option=orjson.OPT_INDENT_2)
                     print("\nResponse Body:")
-                    print(json.dumps(json_data, indent=2))
-                    with open(
+                    print(pretty.decode())
+                    write_queue.put((
                         f"{api_docs_dir}/{flow.request.method}_{flow.request.path.replace('/', '_')}.txt",
-                        "w",
-                    ) as f:
-                        f.write(
-                            f"{flow.request.method} {flow.request.path}\n"
-                            + f"req_body: {flow.request.text}\n"
-                            + f"res_body: {json.dumps(json_data, indent=2)}"
-                        )
-            except json.JSONDecodeError:
+                        f"{flow.request.method} {flow.request.path}\n".encode()
+                        + b"req_body: " + (flow.request.content or b"") + b"\n"
+                        + b"res_body: " + pretty,
+                    ))
+            except (orjson.JSONDecodeError, ValueError):
                 print(f"\nResponse Body: {flow.response.text}")
             print("=" * 50 + "\n")
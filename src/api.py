@@ -1,21 +1,60 @@
-from fastapi import FastAPI, HTTPException, Query, Path, Depends, Body, Header, Security
+from fastapi import FastAPI, HTTPException, Request, Query, Path, Depends, Body, Header
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 from enum import Enum
 from datetime import datetime
-from fastapi.security import APIKeyHeader
+import os
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse, Response
 
+import logging
 import uvicorn
-from helpers import KickAPI
+from curl_cffi.requests import AsyncSession
+from helpers import KickAPI, APIResponse, DiscardingCookieJar
 
 app = FastAPI(
     title="Kick.com Unofficial API",
     description="An unofficial API for Kick.com",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 kick_api = KickAPI()
-session_token_header = APIKeyHeader(name="Authorization", auto_error=False)
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent upstream connections held by the shared session
+MAX_CLIENTS = int(os.getenv("MAX_CLIENTS", 100))
+
+# Seconds to cache upstream responses for read-mostly endpoints
+CACHE_TTL = 30
+RULES_CACHE_TTL = 5 * 60
+LIVE_INFO_CACHE_TTL = 10
+
+# auto_error is off so a missing token yields 401 on every supported FastAPI version
+session_token_bearer = HTTPBearer(description="Kick.com session token", auto_error=False)
+
+
+@app.on_event("startup")
+async def open_http_session():
+    # Chrome impersonation negotiates HTTP/2 with kick.com, so pooled connections are multiplexed
+    # Only the clearance cookies are sent, explicitly per request; nothing accumulates in the session
+    app.state.http_session = AsyncSession(
+        impersonate="chrome120",
+        max_clients=MAX_CLIENTS,
+        cookies=DiscardingCookieJar(),
+    )
+    kick_api.session = app.state.http_session
+
+
+@app.on_event("shutdown")
+async def close_http_session():
+    await app.state.http_session.close()
+
+
+@app.exception_handler(Exception)
+async def handle_unexpected_error(request: Request, exc: Exception):
+    logger.exception(f"Unhandled error on {request.method} {request.url.path}")
+    return ORJSONResponse(status_code=500, content={"detail": "Internal server error"})
 
 
 class SortOption(str, Enum):
@@ -96,7 +135,7 @@ class Video(BaseModel):
     thumbnail_url: str
     duration: int
     views: int
-    created_at: datetime
+    created_at: str  # ISO 8601 timestamp passed through from upstream
 
 
 class Clip(BaseModel):
@@ -117,31 +156,105 @@ class Category(BaseModel):
     icon_url: str
 
 
-def pagination_params(
-    page: int = Query(1, ge=1, description="Page number"),
-    per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+# ISO 8601 date-time, forwarded to upstream verbatim
+ISO8601_PATTERN = (
+    r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$"
+)
+
+# Fields returned by the leaderboards endpoint and their fallbacks when missing upstream
+LEADERBOARD_DEFAULTS = {
+    "gifts": [],
+    "gifts_enabled": True,
+    "gifts_week": [],
+    "gifts_week_enabled": True,
+    "gifts_month": [],
+    "gifts_month_enabled": True,
+}
+
+
+def make_extractor(defaults: Dict[str, Any]):
+    """
+    Compile a function that picks the given keys out of a dict, falling back to their defaults.
+    Field names are baked into the generated bytecode so no spec is walked per call.
+    """
+    namespace = {}
+    fields = []
+    for i, key in enumerate(defaults):
+        namespace[f"_default_{i}"] = defaults[key]
+        fields.append(f"{key!r}: get({key!r}, _default_{i})")
+
+    source = f"def extract(data):\n    get = data.get\n    return {{{', '.join(fields)}}}\n"
+    exec(source, namespace)
+    return namespace["extract"]
+
+
+extract_leaderboards = make_extractor(LEADERBOARD_DEFAULTS)
+
+
+def _raise_not_found(response: APIResponse, label: str, name: Any, detail: str):
+    raise HTTPException(status_code=404, detail=f"{label} '{name}' not found")
+
+
+def _raise_generic(response: APIResponse, label: str, name: Any, detail: str):
+    raise HTTPException(status_code=response.status_code, detail=response.error or detail)
+
+
+_ERROR_HANDLERS = {
+    404: _raise_not_found,
+}
+
+
+def raise_for_response(
+    response: APIResponse,
+    *,
+    name: Any,
+    detail: str,
+    not_found_label: str = "Channel",
+    unauthorized_detail: Optional[str] = None,
 ):
-    return {"page": page, "per_page": per_page}
+    """
+    Raise the HTTPException matching a failed upstream response.
+    Routes that forward a session token pass unauthorized_detail to report a rejected token.
+    """
+    if unauthorized_detail and response.status_code == 401:
+        raise HTTPException(status_code=401, detail=unauthorized_detail)
+
+    handler = _ERROR_HANDLERS.get(response.status_code, _raise_generic)
+    handler(response, not_found_label, name, detail)
 
 
-async def get_session_token(session_token: str = Security(session_token_header)) -> str:
+def passthrough(response: APIResponse) -> Response:
     """
-    Dependency to verify session token exists.
-    Returns the session token if valid, raises 401 if missing or invalid format.
+    Forward the raw upstream JSON body without decoding and re-encoding it.
     """
-    if not session_token:
-        raise HTTPException(
-            status_code=401,
-            detail="Session token is required. Format: 'Bearer your-token-here'"
-        )
-    
-    if not session_token.startswith("Bearer "):
+    return Response(
+        content=response.content,
+        media_type="application/json",
+        status_code=response.status_code,
+    )
+
+
+async def get_session_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(session_token_bearer),
+) -> str:
+    """
+    Dependency returning the bearer session token, raises 401 if missing or malformed.
+    """
+    if credentials is None:
         raise HTTPException(
             status_code=401,
-            detail="Invalid session token format. Must start with 'Bearer'"
+            detail="Session token is required. Format: 'Bearer your-token-here'",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    return session_token
+
+    return credentials.credentials
+
+
+def pagination_params(
+    page: int = Query(1, ge=1, description="Page number"),
+    per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+):
+    return {"page": page, "per_page": per_page}
 
 
 @app.get(
@@ -153,28 +266,17 @@ async def get_chatroom(channel_name: str = Path(..., description="Channel name")
     """
     Get detailed chatroom information for a specific channel.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/chatroom", method="GET"
-        )
-
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch chatroom info",
-            )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/chatroom",
+        method="GET",
+        cache_ttl=CACHE_TTL,
+        decode=False,
+    )
 
-        return response.data
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch chatroom info")
 
-    except Exception as e:
-        print(f"Error fetching chatroom info for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="Internal server error while fetching chatroom info"
-        )
+    return passthrough(response)
 
 
 @app.get(
@@ -184,40 +286,26 @@ async def get_chatroom(channel_name: str = Path(..., description="Channel name")
 )
 async def get_channel_messages(
     channel_id: int = Path(..., description="Channel ID"),
-    start_time: Optional[datetime] = Query(
-        None, description="Get messages after this timestamp"
+    start_time: Optional[str] = Query(
+        None,
+        pattern=ISO8601_PATTERN,
+        description="Get messages after this ISO 8601 timestamp",
     ),
 ):
     """
     Retrieve channel messages with support for pagination and time filtering.
     Messages can be filtered to show only those after a specific timestamp.
     """
-    try:
-        params = {}
-        if start_time:
-            params["start_time"] = start_time.isoformat()
-
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_id}/messages", method="GET", json_data=params
-        )
+    params = {"start_time": start_time} if start_time else None
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_id}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch messages",
-            )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_id}/messages", method="GET", params=params
+    )
 
-        return response.data.get("messages", [])
+    if not response.is_success:
+        raise_for_response(response, name=channel_id, detail="Failed to fetch messages")
 
-    except Exception as e:
-        print(f"Error fetching messages for channel {channel_id}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="Internal server error while fetching messages"
-        )
+    return response.data.get("messages", [])
 
 
 @app.get(
@@ -246,32 +334,20 @@ async def get_chatroom_rules(channel_name: str = Path(..., description="Channel
     Retrieve the chatroom rules for a specific channel.
     Returns just the rules if they exist.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/chatroom/rules", method="GET"
-        )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/chatroom/rules",
+        method="GET",
+        cache_ttl=RULES_CACHE_TTL,
+    )
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch rules",
-            )
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch rules")
 
-        rules = response.data.get("data", {}).get("rules")
-        if not rules:
-            return {"rules": ""}
+    rules = response.data.get("data", {}).get("rules")
+    if not rules:
+        return {"rules": ""}
 
-        return {"rules": rules}
-
-    except Exception as e:
-        print(f"Error fetching rules for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="Internal server error while fetching rules"
-        )
+    return {"rules": rules}
 
 
 @app.get(
@@ -285,46 +361,28 @@ async def get_channel_videos(
     """
     Get channel videos with support for pagination and category filtering.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/videos",
-            method="GET",
-        )
-
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch videos",
-            )
-
-        videos = []
-        for video_data in response.data:
-            videos.append(
-                Video(
-                    id=video_data.get("id"),
-                    title=video_data.get("session_title"),
-                    url=f"https://kick.com/{channel_name}/video/{video_data.get('id')}",
-                    thumbnail_url=video_data.get("thumbnail").get("src"),
-                    duration=int(video_data.get("duration"))
-                    // 1000,  # Convert from milliseconds to seconds
-                    views=video_data.get("views"),
-                    created_at=datetime.fromisoformat(
-                        video_data.get("created_at").replace("Z", "+00:00")
-                    ),
-                )
-            )
-
-        return videos
-
-    except Exception as e:
-        print(f"Error fetching videos for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="Internal server error while fetching videos"
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/videos",
+        method="GET",
+        cache_ttl=CACHE_TTL,
+    )
+
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch videos")
+
+    base_url = f"https://kick.com/{channel_name}/video/"
+    return [
+        Video.model_construct(
+            id=video["id"],
+            title=video["session_title"],
+            url=f"{base_url}{video['id']}",
+            thumbnail_url=video["thumbnail"]["src"],
+            duration=int(video["duration"]) // 1000,  # Convert from milliseconds to seconds
+            views=video["views"],
+            created_at=video["created_at"],
         )
+        for video in response.data
+    ]
 
 
 @app.get(
@@ -340,30 +398,16 @@ async def get_channel_clips(
     """
     Get channel clips with sorting and time filtering options.
     """
-    try:
-        params = {"sort": sort, "time": time}
+    params = {"sort": sort.value, "time": time.value}
 
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/clips", method="GET", json_data=params
-        )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/clips", method="GET", params=params
+    )
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch clips",
-            )
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch clips")
 
-        return response.data.get("clips", [])
-
-    except Exception as e:
-        print(f"Error fetching clips for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="Internal server error while fetching clips"
-        )
+    return response.data.get("clips", [])
 
 
 @app.get(
@@ -377,29 +421,17 @@ async def get_recent_categories(
     """
     Get recent categories for a channel.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/recent-categories", method="GET"
-        )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/recent-categories",
+        method="GET",
+        cache_ttl=CACHE_TTL,
+        decode=False,
+    )
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch recent categories",
-            )
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch recent categories")
 
-        return response.data
-
-    except Exception as e:
-        print(f"Error fetching recent categories for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error while fetching recent categories",
-        )
+    return passthrough(response)
 
 
 @app.get(
@@ -413,35 +445,14 @@ async def get_channel_leaderboards(
     """
     Get channel leaderboards including gifts, weekly gifts, and monthly gifts.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/leaderboards", method="GET"
-        )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/leaderboards", method="GET"
+    )
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404, detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch leaderboards",
-            )
-
-        return {
-            "gifts": response.data.get("gifts", []),
-            "gifts_enabled": response.data.get("gifts_enabled", True),
-            "gifts_week": response.data.get("gifts_week", []),
-            "gifts_week_enabled": response.data.get("gifts_week_enabled", True),
-            "gifts_month": response.data.get("gifts_month", []),
-            "gifts_month_enabled": response.data.get("gifts_month_enabled", True),
-        }
-
-    except Exception as e:
-        print(f"Error fetching leaderboards for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail="Internal server error while fetching leaderboards"
-        )
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch leaderboards")
+
+    return extract_leaderboards(response.data)
 
 
 @app.get(
@@ -453,31 +464,16 @@ async def get_channel_me(channel_name: str = Path(..., description="Channel name
     """
     Get current user's relationship with a channel (following status, subscription, etc.)
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/me",
-            method="GET"
-        )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/me",
+        method="GET",
+        decode=False,
+    )
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch user channel info"
-            )
-
-        return response.data
-
-    except Exception as e:
-        print(f"Error fetching user channel info for {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error while fetching user channel info"
-        )
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch user channel info")
+
+    return passthrough(response)
 
 
 @app.get(
@@ -489,28 +485,18 @@ async def get_channel_polls(channel_name: str = Path(..., description="Channel n
     """
     Get active polls for a channel if any exist.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/polls",
-            method="GET"
-        )
-
-        if not response.is_success:
-            if response.status_code == 404:
-                return {"polls": None}
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch polls"
-            )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/polls",
+        method="GET",
+        decode=False,
+    )
 
-        return response.data
+    if not response.is_success:
+        if response.status_code == 404:
+            return {"polls": None}
+        raise_for_response(response, name=channel_name, detail="Failed to fetch polls")
 
-    except Exception as e:
-        print(f"Error fetching polls for channel {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error while fetching polls"
-        )
+    return passthrough(response)
 
 
 @app.get(
@@ -522,31 +508,17 @@ async def get_channel_info(channel_name: str = Path(..., description="Channel na
     """
     Get detailed information about a channel including livestream status, user details, etc.
     """
-    try:
-        response = kick_api.send_request(
-            f"/api/v2/channels/{channel_name}/info",
-            method="GET"
-        )
+    response = await kick_api.send_request(
+        f"/api/v2/channels/{channel_name}/info",
+        method="GET",
+        cache_ttl=LIVE_INFO_CACHE_TTL,
+        decode=False,
+    )
 
-        if not response.is_success:
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Channel '{channel_name}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to fetch channel info"
-            )
-
-        return response.data
-
-    except Exception as e:
-        print(f"Error fetching channel info for {channel_name}: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error while fetching channel info"
-        )
+    if not response.is_success:
+        raise_for_response(response, name=channel_name, detail="Failed to fetch channel info")
+
+    return passthrough(response)
 
 
 @app.post(
@@ -558,48 +530,41 @@ async def send_message(
     chatroom_id: int = Path(..., description="Chatroom ID"),
     content: str = Body(..., description="Message content"),
     type: str = Body("message", description="Message type"),
-    auth: str = Depends(get_session_token),
+    session_token: str = Depends(get_session_token),
 ):
     """
     Send a message to a chatroom. Requires authentication with a valid session token.
     The token should be provided in the Authorization header with format: 'Bearer your-token-here'
     """
-    try:
-        data = {"content": content, "type": type}
-        headers = {"Authorization": auth}
-
-        response = kick_api.send_request(
-            f"/api/v2/messages/send/{chatroom_id}",
-            method="POST",
-            json_data=data,
-            headers=headers
+    data = {"content": content, "type": type}
+
+    response = await kick_api.send_request(
+        f"/api/v2/messages/send/{chatroom_id}",
+        method="POST",
+        auth=f"Bearer {session_token}",
+        json_data=data,
+    )
+
+    if not response.is_success:
+        raise_for_response(
+            response,
+            name=chatroom_id,
+            not_found_label="Chatroom",
+            unauthorized_detail="Invalid or expired session token",
+            detail="Failed to send message",
         )
 
-        if not response.is_success:
-            if response.status_code == 401:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid or expired session token"
-                )
-            if response.status_code == 404:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Chatroom '{chatroom_id}' not found"
-                )
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=response.error or "Failed to send message"
-            )
-
-        return response.data
-
-    except Exception as e:
-        print(f"Error sending message to chatroom {chatroom_id}: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error while sending message"
-        )
+    return response.data
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=5000,
+        # "auto" picks uvloop and httptools when installed, uvloop is unavailable on Windows
+        loop="auto",
+        http="auto",
+        log_level="warning",
+        access_log=False,
+    )
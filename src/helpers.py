@@ -1,14 +1,44 @@
 from typing import Dict, Tuple, Optional, Any
+import asyncio
 import time
 import curl_cffi.requests as requests
+from cachetools import TLRUCache
+import orjson
+import simdjson
+import threading
 from dataclasses import dataclass
-from urllib.parse import urljoin
+from http.cookiejar import CookieJar
 import logging
 import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How long Cloudflare clearance cookies are reused before being refreshed
+BYPASS_TTL = 20 * 60
+
+# Maximum number of upstream responses kept in the in-process cache
+CACHE_MAXSIZE = 4096
+
+# Payloads above this size are parsed with simdjson; below it orjson is faster
+SIMDJSON_THRESHOLD = 4096
+
+_parser_local = threading.local()
+
+
+def decode_json(content: bytes) -> Any:
+    """
+    Decode a JSON payload, using a reusable per-thread simdjson parser for large bodies
+    """
+    if len(content) <= SIMDJSON_THRESHOLD:
+        return orjson.loads(content)
+
+    parser = getattr(_parser_local, "parser", None)
+    if parser is None:
+        parser = _parser_local.parser = simdjson.Parser()
+    # recursive=True materializes plain dicts/lists so no proxy outlives the parser buffer
+    return parser.parse(content, recursive=True)
+
 @dataclass
 class CloudflareConfig:
     bypass_server_url: str = os.getenv("BYPASS_SERVER_URL", "http://localhost")
@@ -19,6 +49,18 @@ class CloudflareConfig:
     def bypass_endpoint(self) -> str:
         return f"{self.bypass_server_url}:{self.port}/cookies"
 
+@dataclass(frozen=True, slots=True)
+class Bypass:
+    """Cloudflare clearance cookies and the user agent they were issued for"""
+    cookies: Dict
+    user_agent: str
+    expires_at: float
+
+class DiscardingCookieJar(CookieJar):
+    """Cookie jar that never stores response cookies, so one caller's cookies are not replayed for another"""
+    def set_cookie(self, cookie):
+        pass
+
 class RequestError(Exception):
     """Custom exception for request-related errors"""
     pass
@@ -28,65 +70,108 @@ class CloudflareBypassError(RequestError):
     pass
 
 class APIResponse:
-    def __init__(self, status_code: int, data: Optional[Dict] = None, error: Optional[str] = None):
+    def __init__(
+        self,
+        status_code: int,
+        data: Optional[Dict] = None,
+        error: Optional[str] = None,
+        content: Optional[bytes] = None,
+        challenged: bool = False,
+    ):
         self.status_code = status_code
         self.data = data
         self.error = error
+        # Raw body, forwarded as-is by passthrough routes
+        self.content = content
+        # True when Cloudflare answered with a challenge instead of the upstream API
+        self.challenged = challenged
         
     @property
     def is_success(self) -> bool:
         return 200 <= self.status_code < 300 and self.error is None
 
 class KickAPI:
-    def __init__(self, cf_config: Optional[CloudflareConfig] = None):
+    def __init__(
+        self,
+        cf_config: Optional[CloudflareConfig] = None,
+        session: Optional[requests.AsyncSession] = None,
+    ):
         self.cf_config = cf_config or CloudflareConfig()
-        self.bypass_data: Tuple[Optional[Dict], Optional[str]] = (None, None)
+        # Endpoints are absolute paths, so URLs are built by plain concatenation
+        self._base_url = self.cf_config.target_url.rstrip("/")
+        # Clearance from the last successful bypass, None until first fetched
+        self._bypass: Optional[Bypass] = None
+        self._bypass_lock = asyncio.Lock()
+        # Shared async session, usually bound by the app on startup
+        self.session = session
+        # Cached responses are stored as (ttl, response) so each entry carries its own TTL
+        self._cache = TLRUCache(maxsize=CACHE_MAXSIZE, ttu=lambda _key, value, now: now + value[0])
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
         
-    def _make_request(
+    async def _make_request(
         self,
         url: str,
         method: str,
         cf_clearance_cookies: Dict,
-        user_agent: str,
         auth: Optional[str] = None,
+        params: Optional[Dict] = None,
         json_data: Optional[Dict] = None,
+        decode: bool = True,
     ) -> APIResponse:
         """
         Make an HTTP request with Cloudflare bypass data
         """
-        headers = {"User-Agent": user_agent}
-        if auth:
-            headers["Authorization"] = auth
+        headers = {"Authorization": auth} if auth else None
 
         try:
-            response = requests.request(
+            response = await self.session.request(
                 method,
                 url,
                 headers=headers,
                 cookies=cf_clearance_cookies,
+                params=params,
                 json=json_data,
                 timeout=10
             )
             
+            content_type = response.headers.get("content-type", "")
+
+            success = 200 <= response.status_code < 300
+            if success and response.content and "json" not in content_type:
+                logger.error(f"Unexpected content type: {content_type}")
+                return APIResponse(status_code=500, error="Invalid JSON response")
+
+            # Passthrough callers skip decoding and forward the raw body
+            data = None
+            if decode and success and response.content:
+                try:
+                    data = decode_json(response.content)
+                except ValueError as e:
+                    logger.error(f"JSON decode failed: {str(e)}")
+                    return APIResponse(status_code=500, error="Invalid JSON response")
+
+            # Cloudflare challenge pages are HTML, while Kick's own 403s are JSON
+            challenged = response.headers.get("cf-mitigated") == "challenge" or (
+                response.status_code == 403 and "json" not in content_type
+            )
             return APIResponse(
                 status_code=response.status_code,
-                data=response.json() if response.content else None
+                data=data,
+                content=response.content,
+                challenged=challenged,
             )
             
         except requests.RequestsError as e:
             logger.error(f"Request failed: {str(e)}")
             return APIResponse(status_code=500, error=str(e))
-        except ValueError as e:
-            logger.error(f"JSON decode failed: {str(e)}")
-            return APIResponse(status_code=500, error="Invalid JSON response")
 
-    def _get_cf_clearance(self, retry: int = 3) -> Tuple[Optional[Dict], Optional[str]]:
+    async def _get_cf_clearance(self, retry: int = 3) -> Tuple[Optional[Dict], Optional[str]]:
         """
         Get Cloudflare clearance cookies and user agent
         """
         for attempt in range(retry):
             try:
-                response = requests.get(
+                response = await self.session.get(
                     self.cf_config.bypass_endpoint,
                     params={"url": self.cf_config.target_url},
                     timeout=60
@@ -95,23 +180,41 @@ class KickAPI:
                 if response.status_code != 200:
                     raise CloudflareBypassError(f"Bypass server returned status {response.status_code}")
                 
-                data = response.json()
+                data = orjson.loads(response.content)
                 return data["cookies"], data["user_agent"]
                 
             except Exception as e:
                 logger.warning(f"Cloudflare bypass attempt {attempt + 1}/{retry} failed: {str(e)}")
                 if attempt < retry - 1:
-                    time.sleep(0.5 * (attempt + 1))  # Exponential backoff
+                    await asyncio.sleep(0.5 * (attempt + 1))  # Exponential backoff
                     
         raise CloudflareBypassError("Failed to obtain Cloudflare clearance")
 
-    def send_request(
+    async def _get_bypass(self) -> Bypass:
+        """
+        Return cached Cloudflare clearance, refreshing it once for all concurrent callers when expired
+        """
+        bypass = self._bypass
+        if bypass is None or bypass.expires_at < time.monotonic():
+            async with self._bypass_lock:
+                bypass = self._bypass
+                if bypass is None or bypass.expires_at < time.monotonic():
+                    cookies, user_agent = await self._get_cf_clearance()
+                    self.session.headers.update({"User-Agent": user_agent})
+                    bypass = self._bypass = Bypass(cookies, user_agent, time.monotonic() + BYPASS_TTL)
+
+        return bypass
+
+    async def send_request(
         self,
         endpoint: str,
         method: str = "GET",
         auth: Optional[str] = None,
+        params: Optional[Dict] = None,
         json_data: Optional[Dict] = None,
-        retry: int = 3
+        retry: int = 3,
+        cache_ttl: Optional[float] = None,
+        decode: bool = True
     ) -> APIResponse:
         """
         Send an API request with automatic Cloudflare bypass handling
@@ -120,41 +223,96 @@ class KickAPI:
             endpoint: API endpoint path
             method: HTTP method
             auth: Authorization token
+            params: Query string parameters
             json_data: Request body for POST/PUT requests
             retry: Number of retry attempts
+            cache_ttl: Seconds to cache a successful unauthenticated GET, None disables caching
+            decode: Parse a successful JSON body up front, False keeps only the raw content
             
         Returns:
             APIResponse object containing status code and response data
         """
-        url = urljoin(self.cf_config.target_url, endpoint)
+        if cache_ttl is None or method != "GET" or auth:
+            return await self._send_uncached(endpoint, method, auth, params, json_data, retry, decode)
+
+        key = (method, endpoint, frozenset(params.items()) if params else None, decode)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached[1]
+
+        # Concurrent misses for the same key await one shared fetch, whatever its outcome
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._fetch_and_cache(key, cache_ttl, endpoint, method, params, retry, decode)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shielded so a cancelled caller does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    async def _fetch_and_cache(
+        self,
+        key: Tuple,
+        cache_ttl: float,
+        endpoint: str,
+        method: str,
+        params: Optional[Dict],
+        retry: int,
+        decode: bool
+    ) -> APIResponse:
+        """
+        Fetch a cacheable GET upstream and store it if it succeeded
+        """
+        response = await self._send_uncached(endpoint, method, None, params, None, retry, decode)
+        if response.is_success:
+            self._cache[key] = (cache_ttl, response)
+        return response
+
+    async def _send_uncached(
+        self,
+        endpoint: str,
+        method: str,
+        auth: Optional[str],
+        params: Optional[Dict],
+        json_data: Optional[Dict],
+        retry: int,
+        decode: bool
+    ) -> APIResponse:
+        """
+        Send an API request upstream, retrying and refreshing Cloudflare bypass data as needed
+        """
+        url = self._base_url + endpoint
         
         for attempt in range(retry):
             try:
-                # Get or refresh Cloudflare bypass data if needed
-                if not all(self.bypass_data):
-                    self.bypass_data = self._get_cf_clearance()
-                
-                cookies, user_agent = self.bypass_data
-                response = self._make_request(
+                bypass = await self._get_bypass()
+                response = await self._make_request(
                     url=url,
                     method=method,
-                    cf_clearance_cookies=cookies,
-                    user_agent=user_agent,
+                    cf_clearance_cookies=bypass.cookies,
                     auth=auth,
-                    json_data=json_data
+                    params=params,
+                    json_data=json_data,
+                    decode=decode
                 )
                 
                 if response.is_success:
                     return response
-                
-                # Reset bypass data if request failed
-                self.bypass_data = (None, None)
+
+                if response.challenged:
+                    # Clearance was rejected, force a refresh unless another request already did
+                    if self._bypass is bypass:
+                        self._bypass = None
+                elif 400 <= response.status_code < 500:
+                    # Client errors such as 404 will not change on retry
+                    return response
                 
             except Exception as e:
                 logger.error(f"Request attempt {attempt + 1}/{retry} failed: {str(e)}")
-                self.bypass_data = (None, None)
                 
             if attempt < retry - 1:
-                time.sleep(0.5 * (attempt + 1))
+                await asyncio.sleep(0.5 * (attempt + 1))
                 
         return APIResponse(status_code=500, error="Max retries exceeded")